@@ -7,11 +7,13 @@
 """
 
 from io import BytesIO
-from typing import Dict, List, Any
+from tempfile import SpooledTemporaryFile
+from typing import Any, BinaryIO, Dict, List, Union
 
 from openpyxl import Workbook, load_workbook
-from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
-from openpyxl.utils import get_column_letter
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.worksheet.dimensions import ColumnDimension
 
 
 # =========================================================
@@ -30,11 +32,80 @@ SHIFT_COLORS = {
     "研": {"bg": "e1bee7", "fg": "333333"},  # 薄紫背景
 }
 
+# =========================================================
+# 書き出し用スタイル（モジュール読み込み時に1度だけ生成）
+# =========================================================
+
+THIN_BORDER = Border(
+    left=Side(style="thin"),
+    right=Side(style="thin"),
+    top=Side(style="thin"),
+    bottom=Side(style="thin"),
+)
+HEADER_FILL = PatternFill(
+    start_color="f5f5f5", end_color="f5f5f5", fill_type="solid"
+)
+HEADER_FONT = Font(bold=True, size=10)
+CELL_FONT = Font(size=10)
+CENTER_ALIGN = Alignment(horizontal="center", vertical="center")
+
+SHIFT_FILLS = {
+    shift: PatternFill(
+        start_color=colors["bg"],
+        end_color=colors["bg"],
+        fill_type="solid",
+    )
+    for shift, colors in SHIFT_COLORS.items()
+}
+SHIFT_FONTS = {
+    shift: Font(size=10, color=colors["fg"], bold=(shift == "夜"))
+    for shift, colors in SHIFT_COLORS.items()
+}
+
+# 名前付きスタイル名（セルごとの font/fill/border/alignment 設定を1回の参照にする）
+HEADER_STYLE = "shift_header"
+DEFAULT_STYLE = "shift_default"
+SHIFT_STYLES = {shift: f"shift_{shift}" for shift in SHIFT_COLORS}
+
 
-def read_excel(file_bytes: bytes) -> Dict[str, Any]:
+def _register_named_styles(wb: Workbook):
+    """書き出し用の名前付きスタイルをワークブックに登録"""
+    wb.add_named_style(
+        NamedStyle(
+            name=HEADER_STYLE,
+            font=HEADER_FONT,
+            fill=HEADER_FILL,
+            border=THIN_BORDER,
+            alignment=CENTER_ALIGN,
+        )
+    )
+    wb.add_named_style(
+        NamedStyle(
+            name=DEFAULT_STYLE,
+            font=CELL_FONT,
+            border=THIN_BORDER,
+            alignment=CENTER_ALIGN,
+        )
+    )
+    for shift, style_name in SHIFT_STYLES.items():
+        wb.add_named_style(
+            NamedStyle(
+                name=style_name,
+                font=SHIFT_FONTS[shift],
+                fill=SHIFT_FILLS[shift],
+                border=THIN_BORDER,
+                alignment=CENTER_ALIGN,
+            )
+        )
+
+
+def read_excel(source: Union[bytes, BinaryIO]) -> Dict[str, Any]:
     """
     エクセルファイルを読み込んでJSON用の辞書を返す
 
+    source にはバイト列のほか、アップロードされた一時ファイルなどの
+    バイナリファイルオブジェクトをそのまま渡せる（メモリ上へのコピーを避ける）。
+
     Returns:
         {
             "staff_ids": ["001", "002", ...],
@@ -42,32 +113,46 @@ def read_excel(file_bytes: bytes) -> Dict[str, Any]:
             "schedule": [["", "委", "", ...], ...],
         }
     """
-    wb = load_workbook(BytesIO(file_bytes), data_only=True)
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+
+    wb = load_workbook(source, read_only=True, data_only=True)
     ws = wb.active
 
+    # 保存された <dimension> タグが誤っていると行が途中で切れるため、
+    # タグを信用せず実際のセルから範囲を求める
+    ws.reset_dimensions()
+
+    # セルオブジェクトを生成せず値のみを1パスで取得
+    rows = list(ws.iter_rows(values_only=True))
+    wb.close()
+
     # ヘッダー行を探す（数値が連続する行をヘッダーとみなす）
-    header_row = 1
+    header_row = 0
     dates = []
 
-    for row_idx in range(1, min(ws.max_row + 1, 5)):
-        row_dates = []
-        for col in range(2, ws.max_column + 1):
-            val = ws.cell(row_idx, col).value
+    for row_idx, row in enumerate(rows[:4]):
+        # 日付が5個見つかった時点でヘッダー行と判定し、残りの列は見ない
+        date_count = 0
+        for val in row[1:]:
             if val is not None:
                 try:
-                    day_num = int(val)
-                    if 1 <= day_num <= 31:
-                        row_dates.append(day_num)
+                    if 1 <= int(val) <= 31:
+                        date_count += 1
                 except (ValueError, TypeError):
                     pass
-        # 連続した日付が5個以上あればヘッダー行と判定
-        if len(row_dates) >= 5:
+            if date_count >= 5:
+                break
+        if date_count >= 5:
             header_row = row_idx
             break
 
     # 日付ヘッダーを取得
-    for col in range(2, ws.max_column + 1):
-        val = ws.cell(header_row, col).value
+    # 行ごとに長さが異なるため、ヘッダーをシートの最大列数まで補完する
+    max_column = max((len(row) for row in rows), default=0)
+    header = rows[header_row] if rows else ()
+    header += (None,) * (max_column - len(header))
+    for val in header[1:]:
         if val is not None:
             try:
                 day_num = int(val)
@@ -90,20 +175,19 @@ def read_excel(file_bytes: bytes) -> Dict[str, Any]:
     staff_ids: List[str] = []
     schedule: List[List[str]] = []
 
-    for row_idx in range(header_row + 1, ws.max_row + 1):
-        staff_id = ws.cell(row_idx, 1).value
-        if staff_id is None or str(staff_id).strip() == "":
+    for row in rows[header_row + 1:]:
+        staff_id = row[0] if row else None
+        staff_id = "" if staff_id is None else str(staff_id).strip()
+        if staff_id == "":
             continue
 
-        staff_ids.append(str(staff_id).strip())
+        staff_ids.append(staff_id)
 
-        row_data = []
-        for col in range(2, 2 + num_date_cols):
-            val = ws.cell(row_idx, col).value
-            if val is None:
-                row_data.append("")
-            else:
-                row_data.append(str(val).strip())
+        # シフトはここで strip 済みにする（ソルバー側では再度 strip しない）
+        # read-only モードでは行末の空セルが省略されることがあるため補完する
+        values = row[1:1 + num_date_cols]
+        row_data = ["" if val is None else str(val).strip() for val in values]
+        row_data.extend([""] * (num_date_cols - len(row_data)))
         schedule.append(row_data)
 
     return {
@@ -113,83 +197,63 @@ def read_excel(file_bytes: bytes) -> Dict[str, Any]:
     }
 
 
+# 書き出し先バッファのメモリ上限。超えた分は一時ファイルに退避する
+SPOOL_MAX_SIZE = 1 << 20
+
+
 def write_excel(
     staff_ids: List[str],
     dates: List,
     schedule: List[List[str]],
-) -> bytes:
+) -> BinaryIO:
     """
-    勤務表データからエクセルファイルを生成してバイト列で返す
+    勤務表データからエクセルファイルを生成し、先頭にシークしたファイルで返す
+
+    返り値は SPOOL_MAX_SIZE を超えるとディスクに退避する一時ファイルなので、
+    呼び出し側で読み終えたら close すること。
+
+    大きな勤務表でもメモリを抑えるため write-only モードで行単位に書き出す。
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "勤務表"
-
-    # 罫線スタイル
-    thin_border = Border(
-        left=Side(style="thin"),
-        right=Side(style="thin"),
-        top=Side(style="thin"),
-        bottom=Side(style="thin"),
-    )
-    header_fill = PatternFill(
-        start_color="f5f5f5", end_color="f5f5f5", fill_type="solid"
-    )
-    header_font = Font(bold=True, size=10)
-    cell_font = Font(size=10)
-    center_align = Alignment(horizontal="center", vertical="center")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("勤務表")
+    _register_named_styles(wb)
 
-    # ヘッダー行
-    cell = ws.cell(1, 1, "職員番号")
-    cell.font = header_font
-    cell.fill = header_fill
-    cell.border = thin_border
-    cell.alignment = center_align
+    def styled_cell(value, style_name: str) -> WriteOnlyCell:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style_name
+        return cell
+
+    # 列幅・フリーズペイン（write-only モードでは行の書き込み前に設定する）
     ws.column_dimensions["A"].width = 12
+    if dates:
+        # 日付列は1つの <col min max> 範囲としてまとめて幅を設定
+        ws.column_dimensions["B"] = ColumnDimension(
+            ws, index="B", width=4.5, min=2, max=len(dates) + 1
+        )
+    ws.freeze_panes = "B2"
 
-    for i, date_val in enumerate(dates):
-        col = i + 2
-        cell = ws.cell(1, col, date_val)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.border = thin_border
-        cell.alignment = center_align
-        ws.column_dimensions[get_column_letter(col)].width = 4.5
+    # ヘッダー行
+    ws.append(
+        [styled_cell("職員番号", HEADER_STYLE)]
+        + [styled_cell(date_val, HEADER_STYLE) for date_val in dates]
+    )
 
     # データ行
     for row_idx, staff_id in enumerate(staff_ids):
         # 職員ID
-        cell = ws.cell(row_idx + 2, 1, staff_id)
-        cell.font = cell_font
-        cell.border = thin_border
-        cell.alignment = center_align
-
-        # シフトデータ
-        for col_idx, shift in enumerate(schedule[row_idx]):
-            cell = ws.cell(row_idx + 2, col_idx + 2, shift)
-            cell.font = cell_font
-            cell.border = thin_border
-            cell.alignment = center_align
-
-            # 色設定
-            if shift in SHIFT_COLORS:
-                colors = SHIFT_COLORS[shift]
-                cell.fill = PatternFill(
-                    start_color=colors["bg"],
-                    end_color=colors["bg"],
-                    fill_type="solid",
-                )
-                cell.font = Font(
-                    size=10,
-                    color=colors["fg"],
-                    bold=(shift == "夜"),
-                )
-
-    # フリーズペイン（1行目とA列を固定）
-    ws.freeze_panes = "B2"
+        row = [styled_cell(staff_id, DEFAULT_STYLE)]
+
+        # シフトデータ（色設定付き）
+        for shift in schedule[row_idx]:
+            if shift in SHIFT_STYLES:
+                row.append(styled_cell(shift, SHIFT_STYLES[shift]))
+            else:
+                row.append(styled_cell(shift, DEFAULT_STYLE))
+
+        ws.append(row)
 
-    # バイト列に変換
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    return buffer.getvalue()
+    # 一時ファイルに書き出し（大きな勤務表でもメモリ使用量を抑える）
+    output = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    wb.save(output)
+    output.seek(0)
+    return output
@@ -2,11 +2,13 @@
 病棟勤務表 自動作成システム - FastAPI サーバー
 """
 
+import asyncio
+import functools
 import os
-from typing import Any, Dict, List
+from typing import Any, BinaryIO, Callable, Iterator, List, Optional, TypeVar
 
 from fastapi import FastAPI, File, HTTPException, UploadFile
-from fastapi.responses import FileResponse, HTMLResponse, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
@@ -14,11 +16,19 @@ from excel_handler import read_excel, write_excel
 from solver import generate_shift
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+INDEX_PATH = os.path.join(STATIC_DIR, "index.html")
+
+# エクセル処理（openpyxl）の同時実行数上限
+EXCEL_CONCURRENCY = int(os.environ.get("EXCEL_CONCURRENCY", 4))
+
+# ダウンロード時に1回で送るバイト数
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
 
 app = FastAPI(title="病棟勤務表 自動作成システム")
 
 # 静的ファイルの配信
-app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), name="static")
+app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
 
 # =========================================================
@@ -26,11 +36,20 @@ app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), na
 # =========================================================
 
 
+class ShiftSettings(BaseModel):
+    day_leader_count: int
+    night_leader_count: int
+    night_eligible_count: Optional[int] = None
+    required_staff_per_day: int
+    max_night_shifts: int
+    days_off: int
+
+
 class GenerateRequest(BaseModel):
     staff_ids: List[str]
     dates: List[Any]
     schedule: List[List[str]]
-    settings: Dict[str, int]
+    settings: ShiftSettings
 
 
 class DownloadRequest(BaseModel):
@@ -39,6 +58,54 @@ class DownloadRequest(BaseModel):
     schedule: List[List[str]]
 
 
+# =========================================================
+# エクセル処理の実行
+# =========================================================
+
+T = TypeVar("T")
+
+_excel_semaphore = asyncio.Semaphore(EXCEL_CONCURRENCY)
+
+
+async def run_excel_task(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    CPUバウンドなエクセル処理をスレッドプールで実行する
+
+    イベントループをブロックしないようにし、セマフォで同時実行数を制限して
+    アップロードが集中した場合のメモリ消費を抑える。
+    """
+    async with _excel_semaphore:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(func, *args, **kwargs)
+        )
+
+
+def iter_file_chunks(fileobj: BinaryIO) -> Iterator[bytes]:
+    """ファイルオブジェクトを先頭からチャンク単位で読み出す"""
+    while chunk := fileobj.read(DOWNLOAD_CHUNK_SIZE):
+        yield chunk
+
+
+class TemporaryFileResponse(StreamingResponse):
+    """
+    一時ファイルをチャンク単位で送信し、送信後に必ず閉じるレスポンス
+
+    クライアントの切断（ClientDisconnect）でバックグラウンドタスクや
+    イテレーターの後始末が実行されない場合でもファイルを閉じる。
+    """
+
+    def __init__(self, fileobj: BinaryIO, **kwargs):
+        super().__init__(iter_file_chunks(fileobj), **kwargs)
+        self.fileobj = fileobj
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.fileobj.close()
+
+
 # =========================================================
 # ルート
 # =========================================================
@@ -47,7 +114,7 @@ class DownloadRequest(BaseModel):
 @app.get("/")
 async def root():
     """トップページ"""
-    return FileResponse(os.path.join(BASE_DIR, "static", "index.html"))
+    return FileResponse(INDEX_PATH, media_type="text/html")
 
 
 @app.post("/api/upload")
@@ -65,8 +132,8 @@ async def upload_excel(file: UploadFile = File(...)):
         )
 
     try:
-        contents = await file.read()
-        data = read_excel(contents)
+        # 一時ファイルをそのまま解析し、全体をメモリに読み込まない
+        data = await run_excel_task(read_excel, file.file)
     except Exception as e:
         raise HTTPException(
             status_code=400,
@@ -90,28 +157,14 @@ async def generate(request: GenerateRequest):
     Returns:
         { schedule, warnings }
     """
-    # バリデーション
-    required_keys = [
-        "day_leader_count",
-        "night_leader_count",
-        "required_staff_per_day",
-        "max_night_shifts",
-        "days_off",
-    ]
-    for key in required_keys:
-        if key not in request.settings:
-            raise HTTPException(
-                status_code=400,
-                detail=f"設定が不足しています: {key}",
-            )
-
     try:
         num_days = len(request.dates)
         schedule, warnings = generate_shift(
             staff_ids=request.staff_ids,
             num_days=num_days,
             schedule=request.schedule,
-            settings=request.settings,
+            # 未指定の night_eligible_count は渡さず、ソルバー側の既定値を使う
+            settings=request.settings.model_dump(exclude_none=True),
         )
     except Exception as e:
         raise HTTPException(
@@ -128,7 +181,8 @@ async def download_excel(request: DownloadRequest):
     勤務表をエクセルファイルとしてダウンロード
     """
     try:
-        excel_bytes = write_excel(
+        excel_file = await run_excel_task(
+            write_excel,
             staff_ids=request.staff_ids,
             dates=request.dates,
             schedule=request.schedule,
@@ -139,11 +193,16 @@ async def download_excel(request: DownloadRequest):
             detail=f"エクセル生成中にエラーが発生しました: {str(e)}",
         )
 
-    return Response(
-        content=excel_bytes,
+    file_size = excel_file.seek(0, os.SEEK_END)
+    excel_file.seek(0)
+
+    # 一時ファイルをチャンク単位でそのままレスポンスに書き出す
+    return TemporaryFileResponse(
+        excel_file,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={
-            "Content-Disposition": 'attachment; filename="shift_schedule.xlsx"'
+            "Content-Disposition": 'attachment; filename="shift_schedule.xlsx"',
+            "Content-Length": str(file_size),
         },
     )
 
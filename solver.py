@@ -19,24 +19,94 @@
 夜勤ルール: 夜勤 → 明け → 公休（3日セット）
 """
 
-import random
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Set, Tuple, Optional
+
+import numpy as np
+
+# =========================================================
+# シフト種別コード（勤務表グリッドのビットフラグ）
+# =========================================================
+# ビットフラグにしておくと、複数種別の判定をマスク1回で行える
+
+CODE_EMPTY = 0
+CODE_DAY = 1 << 0  # 日
+CODE_NIGHT = 1 << 1  # 夜
+CODE_MORNING_AFTER = 1 << 2  # 明
+CODE_HOLIDAY = 1 << 3  # 公
+CODE_REQUESTED_OFF = 1 << 4  # 希
+CODE_LEAVE = 1 << 5  # 休・有
+CODE_COMMITTEE = 1 << 6  # 委
+CODE_OTHER = 1 << 7  # 上記以外（研など）
+
+SHIFT_CODE: Dict[str, int] = {
+    "": CODE_EMPTY,
+    "日": CODE_DAY,
+    "夜": CODE_NIGHT,
+    "明": CODE_MORNING_AFTER,
+    "公": CODE_HOLIDAY,
+    "希": CODE_REQUESTED_OFF,
+    "休": CODE_LEAVE,
+    "有": CODE_LEAVE,
+    "委": CODE_COMMITTEE,
+}
+
+# コード → シフト文字列の変換表（ソルバーが空セルに割り当てる種別のみ）
+SHIFT_LABEL = np.full(256, "", dtype=object)
+SHIFT_LABEL[CODE_DAY] = "日"
+SHIFT_LABEL[CODE_NIGHT] = "夜"
+SHIFT_LABEL[CODE_MORNING_AFTER] = "明"
+SHIFT_LABEL[CODE_HOLIDAY] = "公"
+
+# 休日扱いのシフト種別（公、希、休、有）
+OFF_MASK = CODE_HOLIDAY | CODE_REQUESTED_OFF | CODE_LEAVE
+
+# 日勤リーダーとして数えるシフト種別（日、委）
+DAY_LEADER_MASK = CODE_DAY | CODE_COMMITTEE
+
+# 夜勤を割り当てられない前後日のシフト種別
+# 翌日は空・明・休日系のみ、翌々日は空・休日系のみ可
+NIGHT_BLOCKED_NEXT = CODE_DAY | CODE_NIGHT | CODE_COMMITTEE | CODE_OTHER
+NIGHT_BLOCKED_AFTER_NEXT = NIGHT_BLOCKED_NEXT | CODE_MORNING_AFTER
+NIGHT_BLOCKED_PREV = CODE_NIGHT | CODE_MORNING_AFTER
+NIGHT_BLOCKED_PREV2 = CODE_NIGHT
+
+
+def find_night_candidates(
+    grid: np.ndarray,
+    night_counts: np.ndarray,
+    max_nights: int,
+    d: int,
+    limit: int,
+) -> np.ndarray:
+    """
+    d日目に夜勤を割り当て可能な職員番号を返す（先頭 limit 人が対象）
+
+    職員ごとに判定せず、対象職員の列をまとめてマスク演算する。
+    """
+    rows = grid[: max(0, limit)]
+    num_days = grid.shape[1]
+
+    # 当日が空で、夜勤上限に達していない
+    ok = (rows[:, d] == CODE_EMPTY) & (night_counts[: len(rows)] < max_nights)
+
+    # 翌日（明け）・翌々日（公休）に置けない種別がない
+    if d + 1 < num_days:
+        ok &= (rows[:, d + 1] & NIGHT_BLOCKED_NEXT) == 0
+    if d + 2 < num_days:
+        ok &= (rows[:, d + 2] & NIGHT_BLOCKED_AFTER_NEXT) == 0
+
+    # 直近の夜勤チェック（夜勤→明け→公休の3日間は夜勤不可）
+    if d >= 1:
+        ok &= (rows[:, d - 1] & NIGHT_BLOCKED_PREV) == 0
+    if d >= 2:
+        ok &= (rows[:, d - 2] & NIGHT_BLOCKED_PREV2) == 0
+
+    return np.flatnonzero(ok)
 
 
 class ShiftGenerator:
     """勤務表自動生成クラス"""
 
-    # シフト種別定数
-    DAY = "日"
-    NIGHT = "夜"
-    MORNING_AFTER = "明"
-    HOLIDAY = "公"
-    COMMITTEE = "委"
-    REQUESTED_OFF = "希"
-
-    # 休日扱いのシフト種別
-    OFF_TYPES = {"公", "希", "休", "有"}
-
     def __init__(
         self,
         staff_ids: List[str],
@@ -48,11 +118,22 @@ class ShiftGenerator:
         self.num_staff = len(staff_ids)
         self.num_days = num_days
 
-        # スケジュールのディープコピー
-        self.schedule = [row[:] for row in schedule]
+        # 元データ（固定セルは出力時にこの文字列をそのまま返す）
+        self.original = np.array(schedule, dtype=object).reshape(
+            self.num_staff, self.num_days
+        )
 
-        # 固定セル（元データで既に値が入っているセル）
-        self.fixed = [[cell.strip() != "" for cell in row] for row in schedule]
+        # シフト種別コードのグリッド（職員 x 日）
+        self.grid = np.array(
+            [
+                [SHIFT_CODE.get(cell, CODE_OTHER) for cell in row]
+                for row in schedule
+            ],
+            dtype=np.uint8,
+        ).reshape(self.num_staff, self.num_days)
+
+        # 固定セル（元データで既に値が入っているセル。入力は strip 済みとする）
+        self.fixed = self.grid != CODE_EMPTY
 
         # 設定値
         self.day_leader_count = settings["day_leader_count"]
@@ -65,7 +146,22 @@ class ShiftGenerator:
         self.days_off = settings["days_off"]
 
         # 夜勤回数カウンター
-        self.night_counts = [0] * self.num_staff
+        self.night_counts = np.zeros(self.num_staff, dtype=np.int16)
+
+        # 乱数生成器
+        self.rng = np.random.default_rng()
+
+        # 日ごとの集計キャッシュ（_set_shift で差分更新する）
+        self.night_staff_per_day: List[Set[int]] = [
+            set(np.flatnonzero(self.grid[:, d] == CODE_NIGHT).tolist())
+            for d in range(self.num_days)
+        ]
+        self.day_counts_per_day: List[int] = np.count_nonzero(
+            self.grid == CODE_DAY, axis=0
+        ).tolist()
+        self.day_leader_counts_per_day: List[int] = np.count_nonzero(
+            self.grid[: max(0, self.day_leader_count)] & DAY_LEADER_MASK, axis=0
+        ).tolist()
 
         # 警告メッセージ
         self.warnings: List[str] = []
@@ -79,7 +175,7 @@ class ShiftGenerator:
         self._assign_day_shifts()
         self._fill_remaining()
         self._validate()
-        return self.schedule, self.warnings
+        return self._to_schedule(), self.warnings
 
     # =========================================================
     # 事前チェック
@@ -109,98 +205,92 @@ class ShiftGenerator:
                     f"最大={total_night_capacity}回"
                 )
 
+    # =========================================================
+    # セル操作
+    # =========================================================
+
+    def _set_shift(self, s: int, d: int, new_code: int):
+        """セルにシフトを設定（日ごとの集計も更新）"""
+        old_code = int(self.grid[s, d])
+        self.grid[s, d] = new_code
+
+        if old_code == CODE_NIGHT:
+            self.night_staff_per_day[d].discard(s)
+        if new_code == CODE_NIGHT:
+            self.night_staff_per_day[d].add(s)
+
+        is_day = new_code == CODE_DAY
+        was_day = old_code == CODE_DAY
+        self.day_counts_per_day[d] += is_day - was_day
+
+        if s < self.day_leader_count:
+            was_leader = bool(old_code & DAY_LEADER_MASK)
+            is_leader = bool(new_code & DAY_LEADER_MASK)
+            self.day_leader_counts_per_day[d] += is_leader - was_leader
+
+    def _to_schedule(self) -> List[List[str]]:
+        """グリッドをシフト文字列の2次元リストに戻す"""
+        # 固定セルは元の値（研などコード化できない値を含む）をそのまま返す
+        return np.where(self.fixed, self.original, SHIFT_LABEL[self.grid]).tolist()
+
     # =========================================================
     # 前処理
     # =========================================================
 
     def _preprocess(self):
         """前処理: 既存の夜勤に明け・公休を補完"""
-        for s in range(self.num_staff):
-            for d in range(self.num_days):
-                if self.schedule[s][d] == self.NIGHT and self.fixed[s][d]:
-                    self.night_counts[s] += 1
-                    # 明けを補完
-                    if d + 1 < self.num_days and self.schedule[s][d + 1] == "":
-                        self.schedule[s][d + 1] = self.MORNING_AFTER
-                    # 公休を補完
-                    if d + 2 < self.num_days and self.schedule[s][d + 2] == "":
-                        self.schedule[s][d + 2] = self.HOLIDAY
+        # 固定の夜勤セルのみを抽出（職員・日の順で返る）
+        staff_idx, day_idx = np.nonzero((self.grid == CODE_NIGHT) & self.fixed)
+        self.night_counts += np.bincount(
+            staff_idx, minlength=self.num_staff
+        ).astype(self.night_counts.dtype)
+
+        for s, d in zip(staff_idx.tolist(), day_idx.tolist()):
+            # 明けを補完
+            if d + 1 < self.num_days and self.grid[s, d + 1] == CODE_EMPTY:
+                self._set_shift(s, d + 1, CODE_MORNING_AFTER)
+            # 公休を補完
+            if d + 2 < self.num_days and self.grid[s, d + 2] == CODE_EMPTY:
+                self._set_shift(s, d + 2, CODE_HOLIDAY)
 
     # =========================================================
-    # 夜勤判定
+    # 夜勤割り当て
     # =========================================================
 
-    def _can_assign_night(self, s: int, d: int) -> bool:
-        """指定職員を指定日に夜勤割り当て可能か判定"""
-        # 当日が空でなければ不可
-        if self.schedule[s][d] != "":
-            return False
-
-        # 夜勤上限チェック
-        if self.night_counts[s] >= self.max_nights:
-            return False
-
-        # 翌日（明け）チェック
-        if d + 1 < self.num_days:
-            cell = self.schedule[s][d + 1]
-            if cell != "" and cell not in (
-                self.MORNING_AFTER,
-                self.HOLIDAY,
-                self.REQUESTED_OFF,
-                "休",
-                "有",
-            ):
-                return False
-
-        # 翌々日（公休）チェック
-        if d + 2 < self.num_days:
-            cell = self.schedule[s][d + 2]
-            if cell != "" and cell not in (
-                self.HOLIDAY,
-                self.REQUESTED_OFF,
-                "休",
-                "有",
-            ):
-                return False
-
-        # 直近の夜勤チェック（夜勤→明け→公休の3日間は夜勤不可）
-        if d >= 1 and self.schedule[s][d - 1] in (self.NIGHT, self.MORNING_AFTER):
-            return False
-        if d >= 2 and self.schedule[s][d - 2] == self.NIGHT:
-            return False
-
-        return True
-
     def _assign_night_block(self, s: int, d: int):
         """夜勤ブロック（夜→明→公）を割り当て"""
-        self.schedule[s][d] = self.NIGHT
+        self._set_shift(s, d, CODE_NIGHT)
         self.night_counts[s] += 1
 
         # 明けを設定（翌日が空の場合）
         if d + 1 < self.num_days:
-            if not self.fixed[s][d + 1]:
-                self.schedule[s][d + 1] = self.MORNING_AFTER
+            if not self.fixed[s, d + 1]:
+                self._set_shift(s, d + 1, CODE_MORNING_AFTER)
             # 固定セルが休日系なら上書きしない（互換性あり）
 
         # 公休を設定（翌々日が空の場合）
         if d + 2 < self.num_days:
-            if not self.fixed[s][d + 2]:
-                if self.schedule[s][d + 2] not in self.OFF_TYPES:
-                    self.schedule[s][d + 2] = self.HOLIDAY
+            if not self.fixed[s, d + 2]:
+                if not self.grid[s, d + 2] & OFF_MASK:
+                    self._set_shift(s, d + 2, CODE_HOLIDAY)
+
+    def _night_candidates(self, d: int, limit: int) -> np.ndarray:
+        """d日目の夜勤候補（先頭 limit 人のうち割り当て可能な職員）"""
+        return find_night_candidates(
+            self.grid, self.night_counts, self.max_nights, d, limit
+        )
 
-    def _select_candidate(self, candidates: List[int]) -> Optional[int]:
+    def _select_candidate(self, candidates: np.ndarray) -> Optional[int]:
         """候補から1人選択（夜勤回数の少ない人を優先 + ランダム）"""
-        if not candidates:
+        if candidates.size == 0:
             return None
 
-        random.shuffle(candidates)
-        candidates.sort(key=lambda s: self.night_counts[s])
+        counts = self.night_counts[candidates]
 
         # 最小夜勤回数 +1 以内の候補からランダム選択
-        min_count = self.night_counts[candidates[0]]
-        top = [s for s in candidates if self.night_counts[s] <= min_count + 1]
+        top = candidates[counts <= counts.min() + 1]
 
-        return random.choice(top)
+        return int(top[self.rng.integers(top.size)])
 
     # =========================================================
     # Phase 1: 夜勤リーダー配置
@@ -211,18 +301,13 @@ class ShiftGenerator:
         for d in range(self.num_days):
             # 既にリーダーが夜勤に入っているか確認
             has_leader = any(
-                self.schedule[s][d] == self.NIGHT
-                for s in range(self.night_leader_count)
+                s < self.night_leader_count for s in self.night_staff_per_day[d]
             )
             if has_leader:
                 continue
 
             # 候補を収集
-            candidates = [
-                s
-                for s in range(self.night_leader_count)
-                if self._can_assign_night(s, d)
-            ]
+            candidates = self._night_candidates(d, self.night_leader_count)
 
             leader = self._select_candidate(candidates)
             if leader is None:
@@ -238,22 +323,11 @@ class ShiftGenerator:
     def _place_night_pairs(self):
         """夜勤ペアを配置（リーダー不在の場合は2人とも配置）"""
         for d in range(self.num_days):
-            # 2人揃うまでループ
-            while True:
-                night_staff = [
-                    s
-                    for s in range(self.num_staff)
-                    if self.schedule[s][d] == self.NIGHT
-                ]
-                if len(night_staff) >= 2:
-                    break
-
+            # 2人揃うまでループ（割り当てのたびに night_staff も更新される）
+            night_staff = self.night_staff_per_day[d]
+            while len(night_staff) < 2:
                 # 候補を収集（夜勤可能者のうち、当日夜勤に入っていない人）
-                candidates = [
-                    s
-                    for s in range(self.night_eligible_count)
-                    if s not in night_staff and self._can_assign_night(s, d)
-                ]
+                candidates = self._night_candidates(d, self.night_eligible_count)
 
                 pair = self._select_candidate(candidates)
                 if pair is None:
@@ -275,30 +349,18 @@ class ShiftGenerator:
 
     def _calculate_day_targets(self) -> List[int]:
         """各職員の目標日勤日数を計算"""
-        targets = []
-        for s in range(self.num_staff):
-            night_count = self.night_counts[s]
+        # 既に確定している休日数（公、希、休、有など）
+        off_counts = np.count_nonzero(self.grid & OFF_MASK, axis=1)
 
-            # 既に確定している休日数（公、希、休、有など）
-            off_count = sum(
-                1
-                for d in range(self.num_days)
-                if self.schedule[s][d] in self.OFF_TYPES
-            )
-
-            # 追加で必要な公休日数
-            additional_off = max(0, self.days_off - off_count)
-
-            # 空きセル数
-            empty_count = sum(
-                1 for d in range(self.num_days) if self.schedule[s][d] == ""
-            )
+        # 追加で必要な公休日数
+        additional_off = np.maximum(0, self.days_off - off_counts)
 
-            # 目標日勤日数 = 空きセル - 追加公休
-            target_day = max(0, empty_count - additional_off)
-            targets.append(target_day)
+        # 空きセル数
+        empty_counts = np.count_nonzero(self.grid == CODE_EMPTY, axis=1)
 
-        return targets
+        # 目標日勤日数 = 空きセル - 追加公休
+        targets = np.maximum(0, empty_counts - additional_off)
+        return targets.tolist()
 
     def _assign_day_shifts(self):
         """日勤リーダーおよび日勤メンバーを配置"""
@@ -306,16 +368,10 @@ class ShiftGenerator:
 
         for d in range(self.num_days):
             # このに空いている職員
-            available = [
-                s for s in range(self.num_staff) if self.schedule[s][d] == ""
-            ]
+            available = np.flatnonzero(self.grid[:, d] == CODE_EMPTY).tolist()
 
             # 既に日勤が入っている人数
-            current_day = sum(
-                1
-                for s in range(self.num_staff)
-                if self.schedule[s][d] == self.DAY
-            )
+            current_day = self.day_counts_per_day[d]
 
             needed = self.required_per_day - current_day
             if needed <= 0:
@@ -324,11 +380,7 @@ class ShiftGenerator:
             selected = []
 
             # --- 日勤リーダーの確保 ---
-            has_day_leader = any(
-                self.schedule[s][d] in (self.DAY, self.COMMITTEE)
-                and s < self.day_leader_count
-                for s in range(self.num_staff)
-            )
+            has_day_leader = self.day_leader_counts_per_day[d] > 0
 
             if not has_day_leader:
                 leader_candidates = [
@@ -345,7 +397,7 @@ class ShiftGenerator:
 
             # --- 残りの日勤メンバー ---
             if needed > 0 and available:
-                random.shuffle(available)
+                self.rng.shuffle(available)
                 available.sort(key=lambda s: targets[s], reverse=True)
 
                 for s in available[:needed]:
@@ -354,7 +406,7 @@ class ShiftGenerator:
 
             # 日勤を割り当て
             for s in selected:
-                self.schedule[s][d] = self.DAY
+                self._set_shift(s, d, CODE_DAY)
 
     # =========================================================
     # Phase 5: 残りを公休で埋める
@@ -362,10 +414,8 @@ class ShiftGenerator:
 
     def _fill_remaining(self):
         """残りの空セルを公休で埋める"""
-        for s in range(self.num_staff):
-            for d in range(self.num_days):
-                if self.schedule[s][d] == "":
-                    self.schedule[s][d] = self.HOLIDAY
+        # 公休は日ごとの集計（夜勤・日勤・日勤リーダー）に影響しないため一括で設定
+        self.grid[self.grid == CODE_EMPTY] = CODE_HOLIDAY
 
     # =========================================================
     # バリデーション
@@ -375,22 +425,14 @@ class ShiftGenerator:
         """生成結果の制約違反をチェック"""
         for d in range(self.num_days):
             # 夜勤人数チェック
-            night_count = sum(
-                1
-                for s in range(self.num_staff)
-                if self.schedule[s][d] == self.NIGHT
-            )
+            night_count = len(self.night_staff_per_day[d])
             if night_count < 2:
                 self.warnings.append(
                     f"{d + 1}日: 夜勤が{night_count}人（2人必要）"
                 )
 
             # 日勤人数チェック
-            day_count = sum(
-                1
-                for s in range(self.num_staff)
-                if self.schedule[s][d] == self.DAY
-            )
+            day_count = self.day_counts_per_day[d]
             if day_count < self.required_per_day:
                 self.warnings.append(
                     f"{d + 1}日: 日勤が{day_count}人"
@@ -398,15 +440,12 @@ class ShiftGenerator:
                 )
 
             # 日勤リーダーチェック
-            has_day_leader = any(
-                self.schedule[s][d] in (self.DAY, self.COMMITTEE)
-                and s < self.day_leader_count
-                for s in range(self.num_staff)
-            )
-            if not has_day_leader:
+            if self.day_leader_counts_per_day[d] == 0:
                 self.warnings.append(f"{d + 1}日: 日勤リーダーがいません")
 
         # 個人別チェック
+        off_days_per_staff = np.count_nonzero(self.grid & OFF_MASK, axis=1)
+
         for s in range(self.num_staff):
             # 夜勤回数
             if self.night_counts[s] > self.max_nights:
@@ -416,11 +455,7 @@ class ShiftGenerator:
                 )
 
             # 公休日数
-            off_days = sum(
-                1
-                for d in range(self.num_days)
-                if self.schedule[s][d] in self.OFF_TYPES
-            )
+            off_days = int(off_days_per_staff[s])
             if off_days < self.days_off - 1:  # 1日の誤差は許容
                 self.warnings.append(
                     f"職員{self.staff_ids[s]}: "
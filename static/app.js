@@ -298,7 +298,11 @@ async function generateShift() {
 
         if (!res.ok) {
             const err = await res.json();
-            throw new Error(err.detail || "シフト生成に失敗しました");
+            // 設定値の検証エラー（422）は detail が配列で返る
+            const detail = Array.isArray(err.detail)
+                ? err.detail.map(e => `${e.loc.slice(-1)[0]}: ${e.msg}`).join("\n")
+                : err.detail;
+            throw new Error(detail || "シフト生成に失敗しました");
         }
 
         const result = await res.json();